@@ -1,8 +1,15 @@
 import subprocess
+import sys
 import re
+import json
+import requests
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from typing import Optional, Dict, Any, List, Tuple
 
 OLLAMA_MODEL = "mistral"
+OLLAMA_URL = "http://localhost:11434/api/generate"
 
 # Import your existing retriever helpers
 from test import (
@@ -11,8 +18,80 @@ from test import (
     choose_best_recording,
     fetch_recording_relations,
     extract_credits,
+    clear_cache,
 )
 
+# background worker used to prefetch relations for the default candidate while the user chooses
+_PREFETCH_POOL = ThreadPoolExecutor(max_workers=1)
+
+def _prefetch_relations(mbid: str, cancel: threading.Event) -> Optional[dict]:
+    """
+    Fetch relations for `mbid` as soon as a rate-limit token is free, without ever
+    making a foreground request wait. Gives up (sending nothing) once `cancel` is set.
+    """
+    while not cancel.is_set():
+        full = fetch_recording_relations(mbid, wait=False)
+        if full is not None:
+            return full
+        cancel.wait(0.1)
+    return None
+
+# persistent client for the local Ollama server (keeps the connection and the model warm)
+_OLLAMA_SESSION = requests.Session()
+
+# ---- Ollama HTTP API helper (falls back to the CLI if the server isn't reachable) ----
+def generate_with_ollama(prompt: str, model: str = OLLAMA_MODEL, timeout: int = 60, echo: bool = False) -> str:
+    """
+    Generate a reply for `prompt`. With echo=True the reply is streamed and written to
+    stdout token by token as it arrives; the full (stripped) text is returned either way.
+    A failure mid-stream raises RuntimeError after ending the partial line, so the
+    caller's fallback text starts on a fresh line.
+    """
+    try:
+        r = _OLLAMA_SESSION.post(
+            OLLAMA_URL,
+            json={"model": model, "prompt": prompt, "stream": echo},
+            timeout=timeout,
+            stream=echo,
+        )
+    except requests.ConnectionError:
+        out = generate_with_ollama_cli(prompt, model, timeout)
+        if echo:
+            sys.stdout.write(out)
+            sys.stdout.flush()
+        return out
+    except requests.Timeout:
+        raise RuntimeError("ollama API timed out.")
+    pieces = []
+    try:
+        with r:
+            r.raise_for_status()
+            if not echo:
+                return r.json()["response"].strip()
+            for line in r.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                # Ollama reports failures inside the stream as {"error": ...}
+                if "error" in chunk:
+                    raise RuntimeError(chunk["error"])
+                piece = chunk.get("response", "")
+                if not pieces:
+                    # match the non-streamed output, which is stripped
+                    piece = piece.lstrip()
+                if piece:
+                    pieces.append(piece)
+                    sys.stdout.write(piece)
+                    sys.stdout.flush()
+                if chunk.get("done"):
+                    break
+            return "".join(pieces).strip()
+    except Exception as e:
+        if pieces:
+            sys.stdout.write("\n")
+            sys.stdout.flush()
+        raise RuntimeError(f"Ollama API failure: {e}")
+
 # ---- Ollama CLI helper (utf-8 safe) ----
 def generate_with_ollama_cli(prompt: str, model: str = OLLAMA_MODEL, timeout: int = 60) -> str:
     try:
@@ -42,41 +121,30 @@ def list_top_candidates(search_res: dict, title_query: str, artist_query: Option
     Return up to top-3 recordings from the search result, ordered by choose_best heuristics.
     """
     recs = search_res.get("recordings", []) or []
-    # compute simple score by similarity to title and artist (reuse choose_best_recording heuristics)
-    # We'll reuse choose_best_recording to find the best; then remove and repeat to get top3.
-    candidates = []
-    remaining = {"recordings": recs}
-    # build a copy list to iterate
-    rec_list = list(recs)
-    # Use the provided choose_best_recording function repeatedly to pick top N
-    for _ in range(min(3, len(rec_list))):
-        best = None
-        best_score = -1.0
-        for r in rec_list:
-            # compute score similar to choose_best_recording implementation
-            rtitle = r.get("title", "")
-            artist_names = " ".join([ac.get("name","") for ac in r.get("artist-credit", [])])
-            # approximate similarity using simple lower-case substring matches and lengths
-            score = 0.0
-            if title_query and rtitle:
-                if title_query.lower() == rtitle.lower():
-                    score += 0.7
-                elif title_query.lower() in rtitle.lower() or rtitle.lower() in title_query.lower():
-                    score += 0.5
-            if artist_query:
-                if artist_query.lower() in artist_names.lower() or artist_names.lower() in artist_query.lower():
-                    score += 0.3
-            # small boost if release present
-            if r.get("releases"):
-                score += 0.01
-            if score > best_score:
-                best_score = score
-                best = r
-        if best:
-            candidates.append(best)
-            rec_list.remove(best)
-        else:
-            break
+    # compute simple score by similarity to title and artist (approximates choose_best_recording heuristics)
+    tq = (title_query or "").casefold()
+    aq = (artist_query or "").casefold()
+
+    def _score(r: dict) -> float:
+        rtitle = r.get("title", "").casefold()
+        artist_names = " ".join([ac.get("name","") for ac in r.get("artist-credit", [])]).casefold()
+        # approximate similarity using simple case-insensitive substring matches
+        score = 0.0
+        if tq and rtitle:
+            if tq == rtitle:
+                score += 0.7
+            elif tq in rtitle or rtitle in tq:
+                score += 0.5
+        if aq:
+            if aq in artist_names or artist_names in aq:
+                score += 0.3
+        # small boost if release present
+        if r.get("releases"):
+            score += 0.01
+        return score
+
+    # single scoring pass; ties keep search order
+    candidates = heapq.nlargest(3, recs, key=_score)
     return candidates
 
 def pretty_candidate_line(idx: int, r: dict) -> str:
@@ -93,9 +161,11 @@ def pretty_candidate_line(idx: int, r: dict) -> str:
     mbid = r.get("id")
     return f"{idx}. \"{title}\" — {artists}" + (f" | Release: {rel_str}" if rel_str else "") + f" | MBID: {mbid}"
 
-def choose_candidate_interactively(search_res: dict, title: str, artist: Optional[str]) -> Optional[dict]:
+def choose_candidate_interactively(search_res: dict, title: str, artist: Optional[str],
+                                   candidates: Optional[List[dict]] = None) -> Optional[dict]:
     """
     If multiple candidates exist, present top-3 and let the user pick.
+    Pass `candidates` to reuse an already computed top-3 list.
     Returns chosen recording dict or None if none chosen.
     """
     recs = search_res.get("recordings", []) or []
@@ -105,7 +175,8 @@ def choose_candidate_interactively(search_res: dict, title: str, artist: Optiona
     if len(recs) == 1:
         return recs[0]
     # prepare top-3 list
-    candidates = list_top_candidates(search_res, title, artist)
+    if candidates is None:
+        candidates = list_top_candidates(search_res, title, artist)
     if not candidates:
         # fallback: return first recording
         return recs[0]
@@ -148,8 +219,20 @@ def retrieve_with_choice(title: str, artist: Optional[str]=None) -> Optional[Dic
 
     # If multiple recordings -> interactive chooser
     chosen_recording = None
+    prefetch = None
     if len(recs) > 1:
-        chosen_recording = choose_candidate_interactively(search_res, title, artist)
+        candidates = list_top_candidates(search_res, title, artist)
+        if candidates:
+            # speculatively fetch relations for the default pick (#1) so the
+            # throttle wait and round trip overlap with the user's choice
+            default_mbid = candidates[0].get("id")
+            cancel = threading.Event()
+            prefetch = (default_mbid, _PREFETCH_POOL.submit(_prefetch_relations, default_mbid, cancel), cancel)
+        chosen_recording = choose_candidate_interactively(search_res, title, artist, candidates)
+        if prefetch and (not chosen_recording or chosen_recording.get("id") != prefetch[0]):
+            # user picked something else (or canceled): stop the prefetch before it spends a token
+            prefetch[2].set()
+            prefetch = None
         if not chosen_recording:
             # user canceled
             return None
@@ -159,7 +242,9 @@ def retrieve_with_choice(title: str, artist: Optional[str]=None) -> Optional[Dic
     # fetch full relations for chosen MBID
     mbid = chosen_recording.get("id")
     try:
-        full = fetch_recording_relations(mbid)
+        full = prefetch[1].result() if prefetch else None
+        if full is None:
+            full = fetch_recording_relations(mbid)
         info = extract_credits(full)
         # attach mbid for traceability
         info["_mbid"] = mbid
@@ -172,46 +257,49 @@ def retrieve_with_choice(title: str, artist: Optional[str]=None) -> Optional[Dic
 def deterministic_producer_check(info: Dict[str,Any], artist_query: str) -> Optional[bool]:
     if not info:
         return None
-    producers = info.get("credits", {}).get("producer", []) or []
+    # names already normalized by extract_credits; normalize here for info built elsewhere
+    norm = info.get("credits_norm")
+    if norm is not None:
+        producers = norm.get("producer", []) or []
+    else:
+        producers = [p.casefold().strip() for p in info.get("credits", {}).get("producer", []) if p]
     if not producers:
         return None
-    aq = artist_query.lower().strip()
-    for p in producers:
-        if p and p.lower().strip() == aq:
-            return True
-    for p in producers:
-        if p and aq in p.lower():
+    aq = artist_query.casefold().strip()
+    # single pass: an exact match wins immediately, a substring match is remembered
+    substring_hit = False
+    for pl in producers:
+        if pl == aq:
             return True
-    return False
+        if aq in pl:
+            substring_hit = True
+    return substring_hit
 
 # ---- build short context for LLM ----
 def build_context_from_info(info: Dict[str,Any]) -> str:
-    lines = []
-    t = info.get("title") or "Unknown title"
-    lines.append(f"Title: {t}")
-    artists = info.get("artists") or []
+    # read each field once up front
+    get = info.get
+    t, artists, rel, date, length_ms, credits, mbid = (
+        get("title"), get("artists"), get("release_title"), get("release_date"),
+        get("length_ms"), get("credits"), get("_mbid"),
+    )
+    lines = [f"Title: {t or 'Unknown title'}"]
     if artists:
         lines.append("Artist(s): " + ", ".join(artists))
-    if info.get("release_title") or info.get("release_date"):
-        rel = info.get("release_title") or ""
-        date = info.get("release_date") or ""
+    if rel or date:
+        rel = rel or ""
         lines.append("Release: " + (f"{rel} ({date})" if date else rel))
-    if info.get("length_ms"):
-        secs = int(info["length_ms"] // 1000)
+    if length_ms:
+        secs = int(length_ms // 1000)
         lines.append(f"Duration_seconds: {secs}")
-    credits = info.get("credits", {}) or {}
+    credits = credits or {}
     for role in ("composer", "lyricist", "producer", "performer"):
-        vals = credits.get(role) or []
+        # already deduplicated by extract_credits
+        vals = credits.get(role)
         if vals:
-            # dedupe
-            seen = []
-            out = []
-            for v in vals:
-                if v and v not in seen:
-                    seen.append(v); out.append(v)
-            lines.append(f"{role.capitalize()}: " + ", ".join(out))
-    if info.get("_mbid"):
-        lines.append(f"MBID: {info.get('_mbid')}")
+            lines.append(f"{role.capitalize()}: " + ", ".join(vals))
+    if mbid:
+        lines.append(f"MBID: {mbid}")
     return "\n".join(lines)
 
 # ---- LLM prompt templates ----
@@ -234,22 +322,29 @@ def compose_prompt_no_producer(context: str, question: str) -> str:
     return f"{SYSTEM_INSTRUCTION}\n\nFACTS:\n{context}\n\nUSER QUESTION: {question}\n\nThe facts do not include producer information. Respond conversationally saying you don't have evidence and avoid guessing."
 
 # ---- yes/no producer question parser (simple heuristics) ----
+_YESNO_PATTERNS = tuple(re.compile(p, re.IGNORECASE) for p in [
+    r'^\s*is\s+["\']?(?P<title>.+?)["\']?\s+produced\s+by\s+["\']?(?P<artist>.+?)["\']?\s*$',
+    r'^\s*was\s+["\']?(?P<title>.+?)["\']?\s+produced\s+by\s+["\']?(?P<artist>.+?)["\']?\s*$',
+    r'^\s*did\s+["\']?(?P<artist>.+?)["\']?\s+produce\s+["\']?(?P<title>.+?)["\']?\s*$',
+    r'^\s*is\s+["\']?(?P<artist>.+?)["\']?\s+(the\s+)?producer\s+of\s+["\']?(?P<title>.+?)["\']?\s*$',
+])
+_BY_SPLIT = re.compile(r'\s+by\s+', re.IGNORECASE)
+# every pattern above starts with one of these words
+_YESNO_LEADS = ("is", "was", "did")
+
 def parse_yesno_producer_question(q: str) -> Optional[Dict[str,str]]:
     s = q.strip().rstrip("?").strip()
-    patterns = [
-        r'^\s*is\s+["\']?(?P<title>.+?)["\']?\s+produced\s+by\s+["\']?(?P<artist>.+?)["\']?\s*$',
-        r'^\s*was\s+["\']?(?P<title>.+?)["\']?\s+produced\s+by\s+["\']?(?P<artist>.+?)["\']?\s*$',
-        r'^\s*did\s+["\']?(?P<artist>.+?)["\']?\s+produce\s+["\']?(?P<title>.+?)["\']?\s*$',
-        r'^\s*is\s+["\']?(?P<artist>.+?)["\']?\s+(the\s+)?producer\s+of\s+["\']?(?P<title>.+?)["\']?\s*$',
-    ]
-    for p in patterns:
-        m = re.search(p, s, flags=re.IGNORECASE)
+    # cheap early-out so ordinary queries ("tell me about ...") skip the regex battery
+    if not s[:3].lower().startswith(_YESNO_LEADS):
+        return None
+    for pat in _YESNO_PATTERNS:
+        m = pat.search(s)
         if m:
             return {"song": m.group("title").strip(), "artist": m.group("artist").strip()}
     return None
 
 def split_title_and_perf(maybe_title: str) -> Tuple[str, Optional[str]]:
-    parts = re.split(r'\s+by\s+', maybe_title, flags=re.IGNORECASE)
+    parts = _BY_SPLIT.split(maybe_title)
     if len(parts) >= 2:
         return parts[0].strip(), parts[1].strip()
     return maybe_title.strip(), None
@@ -258,7 +353,7 @@ def split_title_and_perf(maybe_title: str) -> Tuple[str, Optional[str]]:
 def interactive_loop():
     print("MusicBrainz CLI with top-3 candidate chooser")
     print("Examples: 'Tell me about Bohemian Rhapsody by Queen'  |  'Is Skeletons by Travis Scott produced by Tame Impala?'")
-    print("Commands: help, exit, quit\n")
+    print("Commands: help, clear, exit, quit\n")
 
     while True:
         try:
@@ -275,6 +370,11 @@ def interactive_loop():
             print("Ask about a song or credits. Examples:")
             print("  Tell me about Bohemian Rhapsody by Queen")
             print("  Is Skeletons by Travis Scott produced by Tame Impala?")
+            print("Type 'clear' to forget cached MusicBrainz lookups.")
+            continue
+        if lc == "clear":
+            clear_cache()
+            print("Cleared cached MusicBrainz lookups.")
             continue
 
         # first detect yes/no producer checks
@@ -295,18 +395,22 @@ def interactive_loop():
             det = deterministic_producer_check(info, prod_candidate)
             context = build_context_from_info(info)
             try:
+                # the answer is streamed to the terminal as it is generated
                 if det is True:
                     prompt = compose_prompt_yesno(context, user_input, yes=True)
-                    out = generate_with_ollama_cli(prompt, OLLAMA_MODEL)
-                    print("\n" + out.strip() + f"\n\n(Facts: producers = {', '.join(info.get('credits', {}).get('producer', []) or ['N/A'])})\n")
+                    print()
+                    generate_with_ollama(prompt, OLLAMA_MODEL, echo=True)
+                    print(f"\n\n(Facts: producers = {', '.join(info.get('credits', {}).get('producer', []) or ['N/A'])})\n")
                 elif det is False:
                     prompt = compose_prompt_yesno(context, user_input, yes=False)
-                    out = generate_with_ollama_cli(prompt, OLLAMA_MODEL)
-                    print("\n" + out.strip() + f"\n\n(Facts: producers = {', '.join(info.get('credits', {}).get('producer', []) or ['N/A'])})\n")
+                    print()
+                    generate_with_ollama(prompt, OLLAMA_MODEL, echo=True)
+                    print(f"\n\n(Facts: producers = {', '.join(info.get('credits', {}).get('producer', []) or ['N/A'])})\n")
                 else:
                     prompt = compose_prompt_no_producer(context, user_input)
-                    out = generate_with_ollama_cli(prompt, OLLAMA_MODEL)
-                    print("\n" + out.strip() + f"\n\n(Facts: producers not available)\n")
+                    print()
+                    generate_with_ollama(prompt, OLLAMA_MODEL, echo=True)
+                    print(f"\n\n(Facts: producers not available)\n")
             except Exception as e:
                 # fallback deterministic
                 if det is True:
@@ -340,9 +444,10 @@ def interactive_loop():
         context = build_context_from_info(info)
         prompt = compose_prompt_general(context, user_input)
         try:
-            answer = generate_with_ollama_cli(prompt, OLLAMA_MODEL)
+            print()
+            generate_with_ollama(prompt, OLLAMA_MODEL, echo=True)
             footer = f"\n\n(Facts sourced from MusicBrainz: MBID = {info.get('_mbid')})"
-            print("\n" + answer.strip() + footer + "\n")
+            print(footer + "\n")
         except Exception as e:
             print(f"LLM generation failed: {e}\nFalling back to raw facts:\n")
             print(context + "\n")
@@ -1,63 +1,192 @@
 import requests
+from requests.adapters import HTTPAdapter
 import time
-import re
+import threading
+import json
+from collections import OrderedDict
+from urllib.parse import quote
 from difflib import SequenceMatcher
 from typing import Optional, Dict, Any
 
+try:
+    from rapidfuzz import fuzz  # optional: much faster fuzzy matching (pip install rapidfuzz)
+except ImportError:
+    fuzz = None
+
+try:
+    from orjson import loads as _json_loads  # optional: faster JSON parsing (pip install orjson)
+except ImportError:
+    _json_loads = json.loads
+
 MB_BASE = "https://musicbrainz.org/ws/2"
 USER_AGENT = "MyMusicChatbot/0.1 ( aatishjainn@gmail.com )"  # ← replace with your app + contact
 
-# Respect simple rate-limit (1 req / sec). For production, use a proper rate limiter.
-_last_request_time = 0.0
+# One shared session so consecutive MusicBrainz calls reuse the same keep-alive connection.
+# requests already sends Accept-Encoding for gzip/deflate (plus br/zstd when brotli/zstandard
+# are installed), so compressed responses need no extra header here.
+_SESSION = requests.Session()
+_SESSION.headers.update({"User-Agent": USER_AGENT})
+_SESSION.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+# Respect MusicBrainz rate-limit (1 req / sec) with a small token bucket on the monotonic clock,
+# so wall-clock (NTP) adjustments can't cause extra sleeps or skipped waits.
+# The lock keeps background prefetches from the CLI inside the same budget.
+RATE_LIMIT_PER_SEC = 1.0
+RATE_LIMIT_BURST = 1.0
+_tokens = RATE_LIMIT_BURST
+_last_refill = time.monotonic()
+_throttle_lock = threading.Lock()
 def _throttle():
-    global _last_request_time
-    elapsed = time.time() - _last_request_time
-    if elapsed < 1.0:
-        time.sleep(1.0 - elapsed)
-    _last_request_time = time.time()
+    global _tokens, _last_refill
+    with _throttle_lock:
+        now = time.monotonic()
+        _tokens = min(RATE_LIMIT_BURST, _tokens + (now - _last_refill) * RATE_LIMIT_PER_SEC)
+        _last_refill = now
+        if _tokens < 1.0:
+            time.sleep((1.0 - _tokens) / RATE_LIMIT_PER_SEC)
+            _tokens = 1.0
+            _last_refill = time.monotonic()
+        _tokens -= 1.0
+
+def _try_throttle() -> bool:
+    """
+    Non-blocking _throttle: take a token only if one is free right now. Never sleeps,
+    and gives way to a caller already waiting in _throttle (used for speculative prefetches).
+    """
+    global _tokens, _last_refill
+    if not _throttle_lock.acquire(blocking=False):
+        return False
+    try:
+        now = time.monotonic()
+        _tokens = min(RATE_LIMIT_BURST, _tokens + (now - _last_refill) * RATE_LIMIT_PER_SEC)
+        _last_refill = now
+        if _tokens < 1.0:
+            return False
+        _tokens -= 1.0
+        return True
+    finally:
+        _throttle_lock.release()
+
+# common patterns: "tell me about <title> by <artist>", or just "<title> by <artist>".
+# The lead-in may appear anywhere before the title ("Can you tell me about ...",
+# "What do you know about ...", "Yesterday? Tell me something about ..."). An "about"
+# only counts as a lead-in at the start, after a sentence break, or after one of these
+# words, so titles such as "All About That Bass" are left intact.
+_ABOUT_LEADS = frozenset((
+    "me", "us", "know", "something", "anything", "more", "what", "how", "info", "information",
+))
+_SENTENCE_BREAKS = "?!.:;,"
+
+def _lower_same_length(s: str) -> str:
+    """
+    Lowercase `s` while keeping every index valid for `s`. A few characters change
+    length under str.lower() (e.g. "İ"); those are left as-is.
+    """
+    low = s.lower()
+    if len(low) == len(s):
+        return low
+    return "".join(c.lower() if len(c.lower()) == 1 else c for c in s)
+
+def _rfind_by(low: str) -> int:
+    """
+    Index of the last standalone "by" in `low` (whitespace on both sides), or -1.
+    """
+    i = low.rfind("by")
+    while i > 0:
+        if low[i - 1].isspace() and i + 2 < len(low) and low[i + 2].isspace():
+            return i
+        i = low.rfind("by", 0, i)
+    return -1
+
+def _lead_in_end(low: str, end: int) -> int:
+    """
+    Index just past the first lead-in "about" in `low[:end]`, or 0 if there is none.
+    """
+    i = low.find("about", 0, end)
+    while i >= 0:
+        after = i + 5
+        if after < end and low[after].isspace() and (i == 0 or not low[i - 1].isalnum()):
+            before = low[:i].rstrip()
+            if not before or before[-1] in _SENTENCE_BREAKS or before.rsplit(None, 1)[-1] in _ABOUT_LEADS:
+                return after
+        i = low.find("about", i + 1, end)
+    return 0
 
 def parse_query(text: str) -> Dict[str, Optional[str]]:
     """
     Try to extract (title, artist) from user text using common patterns.
     Fallback: return entire text as title and None as artist.
     """
-    t = text.strip().lower()
-    # common patterns: "tell me about <title> by <artist>"
-    patterns = [
-        r"tell me about\s+['\"]?(?P<title>.+?)['\"]?\s+by\s+(?P<artist>.+)",
-        r"about\s+['\"]?(?P<title>.+?)['\"]?\s+by\s+(?P<artist>.+)",
-        r"what can you tell me about\s+['\"]?(?P<title>.+?)['\"]?\s+by\s+(?P<artist>.+)",
-        r"(?P<title>.+?)\s+by\s+(?P<artist>.+)",  # fallback generic "<title> by <artist>"
-    ]
-    for p in patterns:
-        m = re.search(p, text, flags=re.IGNORECASE)
-        if m:
-            title = m.group("title").strip()
-            artist = m.group("artist").strip()
+    s = text.strip()
+    low = _lower_same_length(s)
+    # split on the last "by" so titles like "Stand By Me by Ben E. King" stay intact
+    idx = _rfind_by(low)
+    if idx >= 0:
+        start = _lead_in_end(low, idx)
+        title = s[start:idx].strip().strip("'\"")
+        artist = s[idx + 2:].strip()
+        if title and artist:
             return {"title": title, "artist": artist}
-    # If not found, try "by" split
-    if " by " in text.lower():
-        parts = text.split(" by ", 1)
-        return {"title": parts[0].strip(), "artist": parts[1].strip()}
     # last fallback: assume whole text is title
     return {"title": text.strip(), "artist": None}
 
 def _similar(a: str, b: str) -> float:
-    return SequenceMatcher(None, (a or "").lower(), (b or "").lower()).ratio()
+    # callers pass already-casefolded strings (see choose_best_recording)
+    a = a or ""
+    b = b or ""
+    if fuzz is not None:
+        return fuzz.WRatio(a, b) / 100.0
+    return SequenceMatcher(None, a, b).ratio()
+
+# LRU of raw response bodies keyed by URL
+_CACHE_MAXSIZE = 256
+_response_cache: "OrderedDict[str, bytes]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+def _cached_get(url: str, wait: bool = True) -> Optional[bytes]:
+    """
+    GET a fully formed MusicBrainz URL and return the raw body. Responses are memoized
+    per URL so repeated lookups skip both the round trip and the throttle;
+    raw bytes are cached (not parsed dicts) so callers can't mutate shared results.
+    With wait=False, returns None instead of waiting for a rate-limit token.
+    """
+    with _cache_lock:
+        if url in _response_cache:
+            _response_cache.move_to_end(url)
+            return _response_cache[url]
+    if wait:
+        _throttle()
+    elif not _try_throttle():
+        return None
+    resp = _SESSION.get(url, timeout=20)
+    resp.raise_for_status()
+    body = resp.content
+    with _cache_lock:
+        _response_cache[url] = body
+        if len(_response_cache) > _CACHE_MAXSIZE:
+            _response_cache.popitem(last=False)
+    return body
+
+def clear_cache() -> None:
+    """
+    Drop all memoized MusicBrainz responses.
+    """
+    with _cache_lock:
+        _response_cache.clear()
 
 def search_recordings(title: str, artist: Optional[str]=None, limit:int=10) -> Any:
     """
     Query MusicBrainz recordings search.
     """
-    _throttle()
+    # MusicBrainz search is case-insensitive, so normalize to share cache entries
+    title = title.strip().casefold()
+    artist = artist.strip().casefold() if artist else None
     q = f'recording:"{title}"'
     if artist:
         q += f' AND artist:"{artist}"'
-    params = {"query": q, "fmt": "json", "limit": str(limit)}
-    headers = {"User-Agent": USER_AGENT}
-    resp = requests.get(f"{MB_BASE}/recording/", params=params, headers=headers, timeout=20)
-    resp.raise_for_status()
-    return resp.json()
+    # build the URL directly; it doubles as the cache key
+    url = f"{MB_BASE}/recording/?query={quote(q)}&fmt=json&limit={limit}"
+    return _json_loads(_cached_get(url))
 
 def choose_best_recording(results: dict, title: str, artist: Optional[str]=None) -> Optional[dict]:
     """
@@ -66,30 +195,40 @@ def choose_best_recording(results: dict, title: str, artist: Optional[str]=None)
     recordings = results.get("recordings", [])
     best = None
     best_score = 0.0
+    # casefold the query once rather than per comparison
+    tq = (title or "").casefold()
+    aq = (artist or "").casefold()
     for r in recordings:
-        rtitle = r.get("title", "")
+        rt = r.get("title", "").casefold()
         # combine artist-credit names if available
-        artist_names = " ".join([ac.get("name","") for ac in r.get("artist-credit", [])])
+        an = " ".join([ac.get("name","") for ac in r.get("artist-credit", [])]).casefold()
         score = 0.0
-        score += 0.6 * _similar(title, rtitle)
+        score += 0.6 * _similar(tq, rt)
         if artist:
-            score += 0.4 * _similar(artist, artist_names)
+            score += 0.4 * _similar(aq, an)
         # boost exact MBID match? (not used here)
         if score > best_score:
             best_score = score
             best = r
     return best
 
-def fetch_recording_relations(mbid: str) -> dict:
+_RELATIONS_INC = quote("artist-credits+releases+work-rels+recording-rels+artist-rels")
+
+def fetch_recording_relations(mbid: str, wait: bool = True) -> Optional[dict]:
     """
     Fetch recording including relationships (works, artist-relationships). Use inc=artist-credits+releases+work-rels
+    With wait=False, returns None (nothing is sent) if the rate limit has no token free right now.
     """
-    _throttle()
-    params = {"fmt": "json", "inc": "artist-credits+releases+work-rels+recording-rels+artist-rels"}
-    headers = {"User-Agent": USER_AGENT}
-    resp = requests.get(f"{MB_BASE}/recording/{mbid}", params=params, headers=headers, timeout=20)
-    resp.raise_for_status()
-    return resp.json()
+    body = _cached_get(f"{MB_BASE}/recording/{mbid}?fmt=json&inc={_RELATIONS_INC}", wait)
+    return _json_loads(body) if body is not None else None
+
+# relation-type substrings for each credit role ("compose" also covers "composer", etc.)
+_ROLE_KEYWORDS = (
+    ("composer", ("compose", "written")),
+    ("lyricist", ("lyric",)),
+    ("producer", ("produce",)),
+    ("performer", ("perform",)),
+)
 
 def extract_credits(recording_json: dict) -> dict:
     """
@@ -104,15 +243,16 @@ def extract_credits(recording_json: dict) -> dict:
     releases = recording_json.get("releases", []) or []
     if releases:
         # choose earliest release by date if present
-        releases_sorted = sorted(releases, key=lambda r: r.get("date") or "9999-99-99")
-        info["release_title"] = releases_sorted[0].get("title")
-        info["release_date"] = releases_sorted[0].get("date")
+        earliest = min(releases, key=lambda r: r.get("date") or "9999-99-99")
+        info["release_title"] = earliest.get("title")
+        info["release_date"] = earliest.get("date")
     else:
         info["release_title"] = None
         info["release_date"] = None
     # relations -> find composers, lyricists, producers
     relations = recording_json.get("relations", []) or recording_json.get("relation-list", []) or []
-    credits = {"composer": [], "lyricist": [], "producer": [], "performer": []}
+    # dicts used as insertion-ordered sets, so names are deduplicated as they are found
+    credits = {"composer": {}, "lyricist": {}, "producer": {}, "performer": {}}
     for rel in relations:
         rtype = rel.get("type", "").lower()
         # artist nested either at rel['artist'] or rel.get('target-credit')
@@ -125,15 +265,13 @@ def extract_credits(recording_json: dict) -> dict:
             artist_name = rel.get("target")
         if not artist_name:
             continue
-        if "compose" in rtype or "composer" in rtype or "written" in rtype:
-            credits["composer"].append(artist_name)
-        if "lyric" in rtype:
-            credits["lyricist"].append(artist_name)
-        if "produce" in rtype or "producer" in rtype:
-            credits["producer"].append(artist_name)
-        if "performer" in rtype or "perform" in rtype:
-            credits["performer"].append(artist_name)
-    info["credits"] = credits
+        # a relation may carry more than one role, so no early break
+        for role, keywords in _ROLE_KEYWORDS:
+            if any(k in rtype for k in keywords):
+                credits[role][artist_name] = None
+    info["credits"] = {role: list(names) for role, names in credits.items()}
+    # casefolded/stripped names, precomputed once for repeated credit checks
+    info["credits_norm"] = {role: [n.casefold().strip() for n in names] for role, names in info["credits"].items()}
     return info
 
 def format_response(info: dict) -> str:
@@ -153,11 +291,11 @@ def format_response(info: dict) -> str:
     credits = info.get("credits", {})
     credit_lines = []
     if credits.get("composer"):
-        credit_lines.append("Written by: " + ", ".join(dict.fromkeys(credits["composer"])))
+        credit_lines.append("Written by: " + ", ".join(credits["composer"]))
     if credits.get("producer"):
-        credit_lines.append("Produced by: " + ", ".join(dict.fromkeys(credits["producer"])))
+        credit_lines.append("Produced by: " + ", ".join(credits["producer"]))
     if credits.get("lyricist"):
-        credit_lines.append("Lyrics: " + ", ".join(dict.fromkeys(credits["lyricist"])))
+        credit_lines.append("Lyrics: " + ", ".join(credits["lyricist"]))
     if credit_lines:
         parts.append(" | ".join(credit_lines))
     if info.get("length_ms"):
@@ -165,6 +303,13 @@ def format_response(info: dict) -> str:
         parts.append(f"Duration: {secs//60}:{secs%60:02d}")
     return "\n".join(parts)
 
+# words that mean the user is asking about credits, which only the relations lookup has
+_RELATION_HINTS = ("produc", "wrote", "written", "writer", "compose", "lyric", "credit")
+
+def _needs_relations(user_text: str) -> bool:
+    t = user_text.lower()
+    return any(h in t for h in _RELATION_HINTS)
+
 # High-level convenience function
 def get_song_info_from_text(user_text: str) -> str:
     parsed = parse_query(user_text)
@@ -177,8 +322,12 @@ def get_song_info_from_text(user_text: str) -> str:
         candidate = choose_best_recording(search_res, title, artist)
         if not candidate:
             return "No matching recording found on MusicBrainz."
-        mbid = candidate.get("id")
-        full = fetch_recording_relations(mbid)
+        if _needs_relations(user_text):
+            full = fetch_recording_relations(candidate.get("id"))
+        else:
+            # search hits already carry title, artist-credit, releases and length,
+            # so skip the second round trip when no credits were asked for
+            full = candidate
         info = extract_credits(full)
         return format_response(info)
     except requests.HTTPError as e:
@@ -193,7 +342,7 @@ def get_song_info_from_text(user_text: str) -> str:
 if __name__ == "__main__":
     print("MusicBrainz Retriever CLI — interactive mode")
     print("Type a query like: Tell me about Bohemian Rhapsody by Queen")
-    print("Commands: 'exit', 'quit', 'help', 'examples'\n")
+    print("Commands: 'exit', 'quit', 'help', 'examples', 'clear'\n")
 
     examples = [
         "Tell me about Bohemian Rhapsody by Queen",
@@ -219,13 +368,17 @@ if __name__ == "__main__":
             print("Enter a natural language query for a song. Examples:")
             for ex in examples:
                 print("  -", ex)
-            print("Commands: 'exit', 'quit', 'help', 'examples'\n")
+            print("Commands: 'exit', 'quit', 'help', 'examples', 'clear' (forget cached lookups)\n")
             continue
         if cmd == "examples":
             print("Examples:")
             for ex in examples:
                 print("  -", ex)
             continue
+        if cmd == "clear":
+            clear_cache()
+            print("Cleared cached MusicBrainz lookups.")
+            continue
 
         # Call the main high-level function from the rest of the file
         try: